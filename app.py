@@ -31,6 +31,11 @@ db = SQLAlchemy(app)
 
 # --- ZALO BOT SETUP ---
 from zalo_module import start_zalo_bot, zalo_send_message
+from explain_module import (
+    INPUT_FEATURES, compute_model_version, build_aggregation_matrix,
+    explain_encoded, input_key, top_factors, format_factors_vi, clear_cache
+)
+from risk_table_module import lookup_probability, clear_tables, DECISION_THRESHOLD
 
 # Start Zalo Bot Thread
 # Thread is started in main block after DB creation to avoid circular issues or early access
@@ -51,53 +56,96 @@ latest_data_from_mqtt = {
 }
 
 # --- HELPER: PERFORM PREDICTION ---
-def perform_prediction_and_alert(user_profile, heart_rate, spo2):
-    """
-    Common function to predict stroke risk and send alerts.
-    Used by both /predict API (Web) and MQTT Callback (Headless).
-    """
-    if model is None or preprocessor is None:
-        print("❌ Model not ready")
-        return None, 0
-
-    input_data = {
+def build_input_row(user_profile, heart_rate, spo2):
+    """Raw model inputs (the 12 features used in training) for one profile + reading."""
+    return {
         'gender': user_profile.gender,
-        'age': user_profile.age,
-        'hypertension': user_profile.hypertension,
-        'heart_disease': user_profile.heart_disease,
+        'age': float(user_profile.age),
+        'hypertension': int(user_profile.hypertension),
+        'heart_disease': int(user_profile.heart_disease),
         'ever_married': user_profile.ever_married,
         'work_type': user_profile.work_type,
         'Residence_type': user_profile.residence_type,
-        'avg_glucose_level': user_profile.avg_glucose_level,
-        'bmi': user_profile.bmi,
+        'avg_glucose_level': float(user_profile.avg_glucose_level),
+        'bmi': float(user_profile.bmi),
         'smoking_status': user_profile.smoking_status,
         'Heart Rate': float(heart_rate),
         'SpO2': float(spo2)
     }
 
+def encode_input_rows(input_rows):
+    """Run raw input rows through the fitted preprocessor in one batch."""
+    input_df = pd.DataFrame(input_rows, columns=INPUT_FEATURES)
+    return preprocessor.transform(input_df)
+
+def score_encoded(input_encoded):
+    """Predicted class and stroke probability for each preprocessed row."""
+    predictions = model.predict(input_encoded)
+    probabilities = [0] * len(predictions)
+    if hasattr(model, "predict_proba"):
+        probabilities = model.predict_proba(input_encoded)[:, 1]
+    return predictions, probabilities
+
+def predict_proba_rows(input_rows):
+    """Stroke probabilities for a batch of raw input rows (used to build risk tables)."""
+    _, probabilities = score_encoded(encode_input_rows(input_rows))
+    return probabilities
+
+def explain_rows(input_rows, input_encoded):
+    """
+    Per-input contributions for rows already encoded for scoring, so explaining
+    reuses the same preprocessed matrix. Cached per model version and input.
+    """
+    if contribution_matrix is None:
+        return [None] * len(input_rows)
+    return explain_encoded(
+        model, input_encoded, [input_key(row) for row in input_rows],
+        contribution_matrix, model_version, app.config['EXPLAIN_CACHE_SIZE']
+    )
+
+def perform_prediction_and_alert(user_profile, heart_rate, spo2, explain=False, use_risk_table=False):
+    """
+    Common function to predict stroke risk and send alerts.
+    Used by both /predict API (Web) and MQTT Callback (Headless).
+    Returns (prediction, probability, explanation); explanation is None unless
+    requested or needed for a Zalo alert.
+    use_risk_table is only set for live sensor readings, so manual form
+    submissions never build or evict lookup tables.
+    """
+    if model is None or preprocessor is None:
+        print("❌ Model not ready")
+        return None, 0, None
+
     try:
-        input_df = pd.DataFrame([{
-            'gender': input_data['gender'],
-            'age': float(input_data['age']),
-            'hypertension': int(input_data['hypertension']),
-            'heart_disease': int(input_data['heart_disease']),
-            'ever_married': input_data['ever_married'],
-            'work_type': input_data['work_type'],
-            'Residence_type': input_data['Residence_type'],
-            'avg_glucose_level': float(input_data['avg_glucose_level']),
-            'bmi': float(input_data['bmi']),
-            'smoking_status': input_data['smoking_status'],
-            'Heart Rate': heart_rate,
-            'SpO2': spo2
-        }])
-        
-        # 3. Preprocess
-        input_encoded = preprocessor.transform(input_df)
-        prediction = model.predict(input_encoded)[0]
-        probability = 0
-        if hasattr(model, "predict_proba"):
-             probability = model.predict_proba(input_encoded)[0][1]
-        
+        input_row = build_input_row(user_profile, heart_rate, spo2)
+        input_encoded = None
+
+        # Fast path: per-profile (Heart Rate x SpO2) lookup table, falls back to the model off-grid
+        probability = None
+        if use_risk_table and app.config['RISK_TABLE_ENABLED'] and hasattr(model, "predict_proba"):
+            probability = lookup_probability(
+                input_row, model_version, predict_proba_rows, app.config['RISK_TABLE_MAX_PROFILES']
+            )
+
+        if probability is not None:
+            prediction = int(probability > DECISION_THRESHOLD)
+        else:
+            input_encoded = encode_input_rows([input_row])
+            predictions, probabilities = score_encoded(input_encoded)
+            prediction = int(predictions[0])
+            probability = float(probabilities[0])
+
+        # Explanations are optional: a failure here must never block the alert below
+        explanation = None
+        if explain or (prediction == 1 and user_profile.zalo_id):
+            try:
+                if input_encoded is None:
+                    input_encoded = encode_input_rows([input_row])
+                explanation = explain_rows([input_row], input_encoded)[0]
+            except Exception as e:
+                explanation = None
+                print(f"Explain Error: {e}")
+
         # --- Notifications ---
         # 1. MQTT Feedback
         if mqtt_client:
@@ -110,14 +158,19 @@ def perform_prediction_and_alert(user_profile, heart_rate, spo2):
              
              # ZALO ALERT
              if user_profile.zalo_id:
-                 warning_msg = f"⚠️ CẢNH BÁO ĐỘT QUỴ TỰ ĐỘNG!\nBệnh nhân: {user_profile.fullname}\nNguy cơ: CAO ({probability:.2%})\nHãy kiểm tra ngay lập tức!"
+                 warning_msg = f"⚠️ CẢNH BÁO ĐỘT QUỴ TỰ ĐỘNG!\nBệnh nhân: {user_profile.fullname}\nNguy cơ: CAO ({probability:.2%})"
+                 if explanation:
+                     factors = top_factors(explanation, app.config['EXPLAIN_TOP_FACTORS'])
+                     if factors:
+                         warning_msg += f"\nYếu tố chính:\n{format_factors_vi(factors, input_row)}"
+                 warning_msg += "\nHãy kiểm tra ngay lập tức!"
                  zalo_send_message(user_profile.zalo_id, warning_msg)
 
-        return prediction, probability
+        return prediction, probability, explanation
 
     except Exception as e:
         print(f"Prediction Error: {e}")
-        return None, 0
+        return None, 0, None
 
 # MQTT Callbacks
 def on_connect(client, userdata, flags, rc):
@@ -147,7 +200,7 @@ def on_message(client, userdata, msg):
             
             if monitored_user and hr > 0:
                 print(f"🔄 Auto-Analyzing for user: {monitored_user.username}")
-                perform_prediction_and_alert(monitored_user, hr, spo2)
+                perform_prediction_and_alert(monitored_user, hr, spo2, use_risk_table=True)
                 
     except Exception as e:
         print("❌ MQTT/Auto-Predict Error:", e)
@@ -170,13 +223,21 @@ except Exception as e:
 model = None
 preprocessor = None
 feature_names = None
+model_version = None
+contribution_matrix = None
+
+MODEL_PATH = 'stroke_xgb_model.pkl'
+PREPROCESSOR_PATH = 'preprocessor.pkl'
 
 def load_trained_assets():
-    global model, preprocessor, feature_names
+    global model, preprocessor, feature_names, model_version, contribution_matrix
     try:
-        model = joblib.load('stroke_xgb_model.pkl')
-        preprocessor = joblib.load('preprocessor.pkl')
-        print("Trained model and preprocessor loaded successfully.")
+        model = joblib.load(MODEL_PATH)
+        preprocessor = joblib.load(PREPROCESSOR_PATH)
+        model_version = compute_model_version(MODEL_PATH, PREPROCESSOR_PATH)
+        clear_cache()
+        clear_tables()
+        print(f"Trained model and preprocessor loaded successfully (version {model_version}).")
 
         global categorical_features_for_app, numerical_features_for_app
         categorical_features_for_app = ['gender', 'ever_married', 'work_type', 'Residence_type', 'smoking_status']
@@ -186,6 +247,13 @@ def load_trained_assets():
         feature_names = list(all_features_after_preprocessing)
         print("Feature names after preprocessing:", feature_names)
 
+        # Maps encoded columns (one-hot etc.) back to the 12 raw inputs for explanations
+        try:
+            contribution_matrix = build_aggregation_matrix(preprocessor)
+        except Exception as e:
+            contribution_matrix = None
+            print(f"Explanations disabled: {e}")
+
     except FileNotFoundError:
         print("Error: Trained model or preprocessor not found. Please run 'train_model.py' first.")
         return
@@ -277,17 +345,11 @@ def login():
     else:
         return jsonify({'message': 'Invalid username or password'}), 401
 
-@app.route('/predict', methods=['POST'])
-def predict():
-    data = request.get_json()
-    user_profile = User.query.filter_by(username=data.get('username')).first()
-
-    if not user_profile:
-        return jsonify({'message': 'User not found'}), 404
-
-    if model is None or preprocessor is None:
-        return jsonify({'message': 'AI model not ready. Please run train_model.py first.'}), 503
-
+def build_request_profile(data, user_profile):
+    """
+    Profile + vitals for a /predict or /explain request.
+    Values sent in the request take priority over the stored profile and live sensor data.
+    """
     # --- PRIORITY: Use Manual Input Data if available, fallback to DB ---
     # We create a placeholder object that mimics the User model
     manual_profile = SimpleNamespace()
@@ -311,18 +373,82 @@ def predict():
     heart_rate = float(data.get('heart_rate', latest_data_from_mqtt['heart_rate'] or 0))
     spo2 = float(data.get('spo2', latest_data_from_mqtt['spo2'] or 0))
 
-    prediction, probability = perform_prediction_and_alert(manual_profile, heart_rate, spo2)
+    return manual_profile, heart_rate, spo2
+
+@app.route('/predict', methods=['POST'])
+def predict():
+    data = request.get_json()
+    user_profile = User.query.filter_by(username=data.get('username')).first()
+
+    if not user_profile:
+        return jsonify({'message': 'User not found'}), 404
+
+    if model is None or preprocessor is None:
+        return jsonify({'message': 'AI model not ready. Please run train_model.py first.'}), 503
+
+    manual_profile, heart_rate, spo2 = build_request_profile(data, user_profile)
+    explain = str(data.get('explain', False)).lower() in ('1', 'true', 'yes')
+
+    prediction, probability, explanation = perform_prediction_and_alert(manual_profile, heart_rate, spo2, explain=explain)
     
     if prediction is None:
          return jsonify({'message': 'Prediction failed internally'}), 500
 
     result_text = "Nguy cơ đột quỵ" if prediction == 1 else "Bình thường"
-    
-    return jsonify({
+
+    response = {
         'result': result_text,
         'probability': f"{probability:.4f}",
         'heart_rate': heart_rate,
         'spo2': spo2
+    }
+    if explain:
+        if explanation:
+            response['explanation'] = dict(explanation, top_factors=top_factors(explanation, app.config['EXPLAIN_TOP_FACTORS']))
+        else:
+            # Same messages as /explain, so clients can tell "unsupported" from "failed"
+            response['explanation'] = None
+            response['explanation_error'] = (
+                'Explanations are not available for this model.' if contribution_matrix is None
+                else 'Explanation failed internally'
+            )
+    return jsonify(response), 200
+
+@app.route('/explain', methods=['POST'])
+def explain_prediction():
+    """Per-input contributions for a prediction, without MQTT feedback or Zalo alerts."""
+    data = request.get_json()
+    user_profile = User.query.filter_by(username=data.get('username')).first()
+
+    if not user_profile:
+        return jsonify({'message': 'User not found'}), 404
+
+    if model is None or preprocessor is None:
+        return jsonify({'message': 'AI model not ready. Please run train_model.py first.'}), 503
+
+    if contribution_matrix is None:
+        return jsonify({'message': 'Explanations are not available for this model.'}), 503
+
+    manual_profile, heart_rate, spo2 = build_request_profile(data, user_profile)
+
+    try:
+        input_row = build_input_row(manual_profile, heart_rate, spo2)
+        input_encoded = encode_input_rows([input_row])
+        predictions, probabilities = score_encoded(input_encoded)
+        explanation = explain_rows([input_row], input_encoded)[0]
+    except Exception as e:
+        print(f"Explain Error: {e}")
+        return jsonify({'message': 'Explanation failed internally'}), 500
+
+    return jsonify({
+        'result': "Nguy cơ đột quỵ" if int(predictions[0]) == 1 else "Bình thường",
+        'probability': f"{float(probabilities[0]):.4f}",
+        'heart_rate': heart_rate,
+        'spo2': spo2,
+        'model_version': model_version,
+        'base_value': explanation['base_value'],
+        'contributions': explanation['contributions'],
+        'top_factors': top_factors(explanation, app.config['EXPLAIN_TOP_FACTORS'])
     }), 200
 
 @app.route('/sensor-data')
@@ -12,3 +12,7 @@ class Config:
     MQTT_TOPIC_RESULT = "stroke/result"
     MQTT_TOPIC_SENSOR = "sensor/data"
     FRONTEND_API_URL = os.environ.get('FRONTEND_API_URL') or 'http://16.176.144.164:5000'
+    EXPLAIN_CACHE_SIZE = int(os.environ.get('EXPLAIN_CACHE_SIZE') or 1024)
+    EXPLAIN_TOP_FACTORS = int(os.environ.get('EXPLAIN_TOP_FACTORS') or 3)
+    RISK_TABLE_ENABLED = (os.environ.get('RISK_TABLE_ENABLED') or 'false').lower() in ('1', 'true', 'yes')
+    RISK_TABLE_MAX_PROFILES = int(os.environ.get('RISK_TABLE_MAX_PROFILES') or 256)
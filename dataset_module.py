@@ -0,0 +1,327 @@
+import hashlib
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+BASE_DIR = os.path.abspath(os.path.dirname(__file__))
+CACHE_DIR = os.environ.get('DATASET_CACHE_DIR') or os.path.join(BASE_DIR, 'dataset_cache')
+MANIFEST_PATH = os.path.join(CACHE_DIR, 'manifest.json')
+# Every build lives in its own BUILDS_DIR/<build_key> folder; only that folder is ever cleaned
+BUILDS_DIR = os.path.join(CACHE_DIR, 'builds')
+# Builds are written to BUILDS_DIR/.tmp-* and renamed into place when complete
+TMP_PREFIX = '.tmp-'
+# In-progress builds older than this are assumed abandoned (crashed process)
+STALE_TMP_SECONDS = 3600
+CACHE_FORMAT_VERSION = 3
+
+# Raw CSVs shipped with the repo, in priority order (first copy of a duplicate wins)
+SOURCES = [
+    'healthcare-dataset-stroke-data(3).csv',
+    'healthcare-dataset-stroke-data(1).csv',
+    'balanced_stroke_dataset (1).csv',
+    'healthcare-dataset-stroke-data(2).csv',
+    'healthcare-dataset-stroke-data.csv',
+]
+
+CONSOLIDATED = 'consolidated'
+
+# Column -> stored type. 'category' columns are stored as integer codes + a category list.
+SCHEMA = {
+    'id': 'int64',
+    'gender': 'category',
+    'age': 'float64',
+    'hypertension': 'int64',
+    'heart_disease': 'int64',
+    'ever_married': 'category',
+    'work_type': 'category',
+    'Residence_type': 'category',
+    'avg_glucose_level': 'float64',
+    'bmi': 'float64',
+    'smoking_status': 'category',
+    'stroke': 'int64',
+    'Heart Rate': 'float64',
+    'SpO2': 'float64',
+}
+# Only these columns may contain missing values
+NULLABLE = {'bmi'}
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def _source_path(name):
+    return os.path.join(BASE_DIR, name)
+
+
+def validate_source(path):
+    """Parse a CSV and coerce it to SCHEMA. Raises ValueError if it does not fit."""
+    df = pd.read_csv(path, na_values=['N/A'])
+    missing = [c for c in SCHEMA if c not in df.columns]
+    if missing:
+        raise ValueError(f"missing columns {missing}")
+
+    df = df[list(SCHEMA)].copy()
+    for column, kind in SCHEMA.items():
+        if kind == 'category':
+            if df[column].isna().any():
+                raise ValueError(f"column '{column}' has missing values")
+            df[column] = df[column].astype(str)
+            continue
+        values = pd.to_numeric(df[column], errors='coerce')
+        if (values.isna() & df[column].notna()).any():
+            raise ValueError(f"column '{column}' has non-numeric values")
+        if column not in NULLABLE and values.isna().any():
+            raise ValueError(f"column '{column}' has missing values")
+        if kind == 'int64' and not (values.dropna() == values.dropna().round()).all():
+            raise ValueError(f"column '{column}' has non-integer values")
+        df[column] = values.astype(kind)
+    return df
+
+
+def _codes_dtype(n_categories):
+    """Smallest code dtype, matching what pd.Categorical uses so codes are not recast on load."""
+    if n_categories < np.iinfo(np.int8).max:
+        return np.int8
+    if n_categories < np.iinfo(np.int16).max:
+        return np.int16
+    return np.int32
+
+
+def _write_table(build_dir, build_key, name, df):
+    """
+    Write one .npy file per column into build_dir/name; return the table's
+    manifest entry, pointing at where the build will live once renamed into place.
+    """
+    table_dir = os.path.join(build_dir, name)
+    os.makedirs(table_dir, exist_ok=True)
+    categories = {}
+    for i, column in enumerate(df.columns):
+        values = df[column]
+        if SCHEMA.get(column) == 'category':
+            codes, uniques = pd.factorize(values, sort=True)
+            categories[column] = [str(u) for u in uniques]
+            array = codes.astype(_codes_dtype(len(uniques)))
+        else:
+            array = values.to_numpy()
+        np.save(os.path.join(table_dir, f"{i:02d}.npy"), np.ascontiguousarray(array))
+    return {
+        'dir': os.path.join(os.path.relpath(BUILDS_DIR, CACHE_DIR), build_key, name),
+        'columns': list(df.columns),
+        'categories': categories,
+        'rows': int(len(df)),
+    }
+
+
+def build_cache():
+    """
+    Validate every source, collapse byte-identical files, write a columnar table
+    per distinct source plus a deduplicated 'consolidated' table, and record
+    provenance hashes in the manifest. Returns the manifest.
+    """
+    sources = {}
+    frames = {}
+    seen_hashes = {}
+    for name in SOURCES:
+        path = _source_path(name)
+        if not os.path.exists(path):
+            continue
+        stat = os.stat(path)
+        entry = {'sha256': file_sha256(path), 'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+        if entry['sha256'] in seen_hashes:
+            entry.update(status='duplicate', duplicate_of=seen_hashes[entry['sha256']])
+        else:
+            try:
+                frames[name] = validate_source(path)
+                seen_hashes[entry['sha256']] = name
+                entry.update(status='ok', rows=len(frames[name]))
+            except ValueError as e:
+                entry.update(status='invalid', error=str(e))
+        sources[name] = entry
+
+    if not frames:
+        raise FileNotFoundError("No valid stroke dataset CSV found.")
+
+    build_key = hashlib.sha256(
+        json.dumps([CACHE_FORMAT_VERSION] + [(n, e['sha256']) for n, e in sources.items()]).encode()
+    ).hexdigest()[:16]
+    build_dir = os.path.join(BUILDS_DIR, build_key)
+    _remove_old_builds()
+    tmp_dir = os.path.join(BUILDS_DIR, f"{TMP_PREFIX}{build_key}-{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    tables = {}
+    valid_names = list(frames)
+    for name, df in frames.items():
+        tables[name] = _write_table(tmp_dir, build_key, sources[name]['sha256'][:16], df)
+
+    # Consolidated: unique records across sources; bit i of 'source_mask' = present in valid_names[i]
+    combined = pd.concat(
+        [df.assign(source_mask=np.int64(1 << i)) for i, df in enumerate(frames.values())],
+        ignore_index=True
+    )
+    row_hash = pd.util.hash_pandas_object(combined[list(SCHEMA)], index=False).to_numpy()
+    masks = combined['source_mask'].groupby(row_hash).agg(lambda m: np.bitwise_or.reduce(m.to_numpy()))
+    first = ~pd.Series(row_hash).duplicated().to_numpy()
+    consolidated = combined.loc[first].reset_index(drop=True)
+    consolidated['source_mask'] = masks.loc[row_hash[first]].to_numpy()
+    tables[CONSOLIDATED] = _write_table(tmp_dir, build_key, CONSOLIDATED, consolidated)
+    tables[CONSOLIDATED]['mask_sources'] = valid_names
+    consolidated_masks = consolidated['source_mask'].to_numpy()
+    for i, name in enumerate(valid_names):
+        sources[name]['unique_rows'] = int((~frames[name].duplicated()).sum())
+        sources[name]['rows_in_consolidated'] = int(((consolidated_masks >> i) & 1).sum())
+
+    manifest = {
+        'format_version': CACHE_FORMAT_VERSION,
+        'build_key': build_key,
+        'sources': sources,
+        'tables': tables,
+    }
+
+    # Publish the finished build atomically, then point the manifest at it
+    if os.path.isdir(build_dir) and not _tables_present(manifest):
+        shutil.rmtree(build_dir, ignore_errors=True)
+    try:
+        os.replace(tmp_dir, build_dir)
+    except OSError:
+        # Another process already published the same sources; keep its copy
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+    _write_manifest(manifest)
+    return manifest
+
+
+def _remove_old_builds():
+    """
+    Delete builds left over from earlier manifests. Runs when the next build
+    starts, never touching the build the current manifest points to (readers
+    may still be using it) or another process's in-progress build.
+    """
+    if not os.path.isdir(BUILDS_DIR):
+        return
+    current = _read_manifest()
+    keep = current.get('build_key') if current else None
+    for entry in os.listdir(BUILDS_DIR):
+        entry_path = os.path.join(BUILDS_DIR, entry)
+        if not os.path.isdir(entry_path) or entry == keep:
+            continue
+        if entry.startswith(TMP_PREFIX) and time.time() - os.path.getmtime(entry_path) < STALE_TMP_SECONDS:
+            continue
+        shutil.rmtree(entry_path, ignore_errors=True)
+
+
+def _write_manifest(manifest):
+    tmp_path = f"{MANIFEST_PATH}.{os.getpid()}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, MANIFEST_PATH)
+
+
+def _read_manifest():
+    try:
+        with open(MANIFEST_PATH) as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _tables_present(manifest):
+    """True if every column file the manifest points to is still on disk."""
+    for table in manifest['tables'].values():
+        table_dir = os.path.join(CACHE_DIR, table['dir'])
+        for i in range(len(table['columns'])):
+            if not os.path.exists(os.path.join(table_dir, f"{i:02d}.npy")):
+                return False
+    return True
+
+
+def _is_stale(manifest):
+    """
+    True if any source was added, removed or changed since the cache was built,
+    or if the build's column files are missing (e.g. builds/ was deleted).
+    Sources whose mtime changed but whose content did not (e.g. touched or
+    re-checked-out) get their recorded mtime refreshed so they are not re-hashed
+    on every load.
+    """
+    if manifest is None or manifest.get('format_version') != CACHE_FORMAT_VERSION:
+        return True
+    if not _tables_present(manifest):
+        return True
+    present = [n for n in SOURCES if os.path.exists(_source_path(n))]
+    if present != list(manifest['sources']):
+        return True
+    refreshed = False
+    for name in present:
+        entry = manifest['sources'][name]
+        stat = os.stat(_source_path(name))
+        if (stat.st_size, stat.st_mtime_ns) == (entry['size'], entry['mtime_ns']):
+            continue
+        # Metadata changed: only the content hash decides
+        if stat.st_size != entry['size'] or file_sha256(_source_path(name)) != entry['sha256']:
+            return True
+        entry['mtime_ns'] = stat.st_mtime_ns
+        refreshed = True
+    if refreshed:
+        _write_manifest(manifest)
+    return False
+
+
+def get_manifest(rebuild=False):
+    """Current manifest, rebuilding the cache first if it is missing or out of date."""
+    manifest = _read_manifest()
+    if rebuild or _is_stale(manifest):
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        print("Building dataset cache...")
+        manifest = build_cache()
+    return manifest
+
+
+def load_dataset(source=CONSOLIDATED):
+    """
+    Load a cached table as a DataFrame.
+    `source` is a CSV name from SOURCES (byte-identical duplicates resolve to the
+    first copy) or 'consolidated' for deduplicated records across all valid sources.
+    Numeric columns are read-only memory-mapped arrays; category columns are
+    pd.Categorical wrapping the memory-mapped codes, so nothing is copied.
+    """
+    manifest = get_manifest()
+    if source != CONSOLIDATED:
+        entry = manifest['sources'].get(source)
+        if entry is None:
+            raise FileNotFoundError(f"{source} not found.")
+        if entry['status'] == 'invalid':
+            raise ValueError(f"{source} failed validation: {entry['error']}")
+        if entry['status'] == 'duplicate':
+            source = entry['duplicate_of']
+
+    table = manifest['tables'][source]
+    table_dir = os.path.join(CACHE_DIR, table['dir'])
+    columns = {}
+    for i, column in enumerate(table['columns']):
+        array = np.load(os.path.join(table_dir, f"{i:02d}.npy"), mmap_mode='r')
+        if column in table['categories']:
+            array = pd.Categorical.from_codes(array, table['categories'][column])
+        columns[column] = array
+    return pd.DataFrame(columns, copy=False)
+
+
+if __name__ == "__main__":
+    # Build / refresh the cache: python dataset_module.py [--rebuild]
+    manifest = get_manifest(rebuild='--rebuild' in sys.argv)
+    for name, entry in manifest['sources'].items():
+        detail = {
+            'ok': f"{entry.get('rows')} rows, {entry.get('unique_rows')} unique",
+            'duplicate': f"identical to {entry.get('duplicate_of')}",
+            'invalid': entry.get('error'),
+        }[entry['status']]
+        print(f"{name}: {entry['status']} ({detail}) sha256={entry['sha256'][:12]}")
+    print(f"{CONSOLIDATED}: {manifest['tables'][CONSOLIDATED]['rows']} unique records")
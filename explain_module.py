@@ -0,0 +1,172 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import xgboost as xgb
+
+# The 12 raw inputs the model is fed, in the order the app builds them
+INPUT_FEATURES = [
+    'gender', 'age', 'hypertension', 'heart_disease', 'ever_married', 'work_type',
+    'Residence_type', 'avg_glucose_level', 'bmi', 'smoking_status', 'Heart Rate', 'SpO2'
+]
+
+# Labels used in the Zalo alert text
+FEATURE_LABELS_VI = {
+    'gender': 'Giới tính',
+    'age': 'Tuổi',
+    'hypertension': 'Huyết áp cao',
+    'heart_disease': 'Bệnh tim',
+    'ever_married': 'Hôn nhân',
+    'work_type': 'Công việc',
+    'Residence_type': 'Nơi ở',
+    'avg_glucose_level': 'Đường huyết',
+    'bmi': 'BMI',
+    'smoking_status': 'Hút thuốc',
+    'Heart Rate': 'Nhịp tim',
+    'SpO2': 'SpO2'
+}
+
+# Display values for the Zalo alert (same wording as the Zalo profile command)
+VALUE_LABELS_VI = {
+    'gender': {"Male": "Nam", "Female": "Nữ", "Other": "Khác"},
+    'ever_married': {"Yes": "Đã kết hôn", "No": "Độc thân"},
+    'work_type': {
+        "Private": "Tư nhân", "Self-employed": "Tự kinh doanh",
+        "Govt_job": "Nhà nước", "children": "Trẻ em", "Never_worked": "Chưa đi làm"
+    },
+    'Residence_type': {"Urban": "Thành thị", "Rural": "Nông thôn"},
+    'smoking_status': {
+        "formerly smoked": "Đã từng hút", "never smoked": "Không hút",
+        "smokes": "Đang hút", "Unknown": "Không rõ"
+    },
+}
+FLAG_FEATURES = {'hypertension', 'heart_disease'}
+# Numeric inputs: (decimal places, unit)
+NUMBER_FORMATS = {
+    'age': (0, ''),
+    'avg_glucose_level': (1, ' mg/dL'),
+    'bmi': (1, ''),
+    'Heart Rate': (0, ' bpm'),
+    'SpO2': (0, '%'),
+}
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def compute_model_version(*paths):
+    """Short content hash of the model artifacts, used to key cached explanations."""
+    digest = hashlib.sha256()
+    for path in paths:
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+    return digest.hexdigest()[:12]
+
+
+def build_aggregation_matrix(preprocessor):
+    """
+    Build a (n_encoded_columns, n_inputs) 0/1 matrix mapping every column produced
+    by the fitted ColumnTransformer back to the raw input it came from.
+    Multiplying the contribution matrix by it sums one-hot columns per input.
+    """
+    owners = []
+    for name, transformer, columns in preprocessor.transformers_:
+        if name == 'remainder' or transformer == 'drop':
+            continue
+        if hasattr(transformer, 'categories_'):
+            for column, categories in zip(columns, transformer.categories_):
+                owners.extend([column] * len(categories))
+        else:
+            owners.extend(columns)
+
+    n_encoded = len(preprocessor.get_feature_names_out())
+    if len(owners) != n_encoded:
+        raise ValueError(f"Could not map {n_encoded} encoded columns back to inputs (got {len(owners)})")
+
+    matrix = np.zeros((n_encoded, len(INPUT_FEATURES)), dtype=np.float32)
+    for row, owner in enumerate(owners):
+        matrix[row, INPUT_FEATURES.index(owner)] = 1.0
+    return matrix
+
+
+def input_key(row):
+    """Hashable cache key for one raw input row (dict keyed by INPUT_FEATURES)."""
+    return tuple(row[f] for f in INPUT_FEATURES)
+
+
+def explain_encoded(model, X_encoded, keys, aggregation, model_version, cache_size=1024):
+    """
+    Per-input contributions (log-odds) for a batch of already preprocessed rows.
+    Rows whose (model_version, key) is cached are served from memory; the rest are
+    computed together in a single pred_contribs call on the same encoded matrix
+    that was used for scoring.
+    """
+    results = [None] * len(keys)
+    missing = []
+    with _cache_lock:
+        for i, key in enumerate(keys):
+            cached = _cache.get((model_version, key))
+            if cached is not None:
+                _cache.move_to_end((model_version, key))
+                results[i] = cached
+            else:
+                missing.append(i)
+
+    if missing:
+        X_missing = X_encoded[missing]
+        contribs = model.get_booster().predict(xgb.DMatrix(X_missing), pred_contribs=True)
+        # Last column is the bias term; the rest map 1:1 to encoded columns
+        per_input = contribs[:, :-1] @ aggregation
+        base_values = contribs[:, -1]
+
+        with _cache_lock:
+            for j, i in enumerate(missing):
+                explanation = {
+                    'base_value': round(float(base_values[j]), 4),
+                    'contributions': {
+                        feature: round(float(value), 4)
+                        for feature, value in zip(INPUT_FEATURES, per_input[j])
+                    }
+                }
+                results[i] = explanation
+                _cache[(model_version, keys[i])] = explanation
+            while len(_cache) > cache_size:
+                _cache.popitem(last=False)
+
+    return results
+
+
+def top_factors(explanation, n=3):
+    """Inputs that pushed the risk up the most, strongest first."""
+    ranked = sorted(explanation['contributions'].items(), key=lambda item: item[1], reverse=True)
+    return [
+        {'feature': feature, 'contribution': value}
+        for feature, value in ranked[:n] if value > 0
+    ]
+
+
+def format_value_vi(feature, value):
+    """Human-readable value of one input for the Zalo alert (Có/Không, rounded numbers, translated categories)."""
+    if feature in FLAG_FEATURES:
+        return 'Có' if int(value) else 'Không'
+    if feature in NUMBER_FORMATS:
+        decimals, unit = NUMBER_FORMATS[feature]
+        return f"{float(value):.{decimals}f}{unit}"
+    return VALUE_LABELS_VI.get(feature, {}).get(value, value)
+
+
+def format_factors_vi(factors, input_row):
+    """Render top factors as lines for the Zalo alert."""
+    lines = []
+    for factor in factors:
+        feature = factor['feature']
+        label = FEATURE_LABELS_VI.get(feature, feature)
+        lines.append(f"• {label}: {format_value_vi(feature, input_row[feature])} (+{factor['contribution']:.2f})")
+    return "\n".join(lines)
+
+
+def clear_cache():
+    with _cache_lock:
+        _cache.clear()
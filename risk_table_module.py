@@ -0,0 +1,130 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+
+from explain_module import INPUT_FEATURES
+
+# Grid covers the physiological range at sensor resolution (1 bpm, 1 %)
+HR_MIN, HR_MAX = 30, 220
+SPO2_MIN, SPO2_MAX = 70, 100
+HEART_RATES = np.arange(HR_MIN, HR_MAX + 1, dtype=np.float64)
+SPO2_VALUES = np.arange(SPO2_MIN, SPO2_MAX + 1, dtype=np.float64)
+
+# XGBClassifier.predict() labels a row positive when its probability is > 0.5
+DECISION_THRESHOLD = 0.5
+
+# Everything except the two live vitals identifies a profile
+PROFILE_FEATURES = [f for f in INPUT_FEATURES if f not in ('Heart Rate', 'SpO2')]
+
+_tables = OrderedDict()
+_tables_lock = threading.Lock()
+
+
+def profile_key(input_row):
+    return tuple(input_row[f] for f in PROFILE_FEATURES)
+
+
+def grid_rows(input_row):
+    """One raw input row per (Heart Rate, SpO2) cell, row-major by heart rate."""
+    hr_grid, spo2_grid = np.meshgrid(HEART_RATES, SPO2_VALUES, indexing='ij')
+    return [
+        dict(input_row, **{'Heart Rate': float(hr), 'SpO2': float(spo2)})
+        for hr, spo2 in zip(hr_grid.ravel(), spo2_grid.ravel())
+    ]
+
+
+def build_risk_table(input_row, predict_proba_rows):
+    """
+    Dense (len(HEART_RATES), len(SPO2_VALUES)) float32 probability grid for the
+    profile in input_row, scored in a single batch by predict_proba_rows.
+    """
+    probabilities = np.asarray(predict_proba_rows(grid_rows(input_row)), dtype=np.float32)
+    return probabilities.reshape(len(HEART_RATES), len(SPO2_VALUES))
+
+
+def grid_index(heart_rate, spo2):
+    """(row, col) of a reading in the grid, or None if it is off-grid."""
+    if not (float(heart_rate).is_integer() and float(spo2).is_integer()):
+        return None
+    if not (HR_MIN <= heart_rate <= HR_MAX and SPO2_MIN <= spo2 <= SPO2_MAX):
+        return None
+    return int(heart_rate) - HR_MIN, int(spo2) - SPO2_MIN
+
+
+def lookup_probability(input_row, model_version, predict_proba_rows, max_profiles=256):
+    """
+    Stroke probability for input_row from the profile's cached grid, building the
+    grid on first use. Returns None for off-grid readings so callers fall back to
+    direct inference. At most max_profiles grids are kept (least recently used
+    are evicted); each is ~23 KB.
+    """
+    index = grid_index(input_row['Heart Rate'], input_row['SpO2'])
+    if index is None:
+        return None
+
+    key = (model_version, profile_key(input_row))
+    with _tables_lock:
+        table = _tables.get(key)
+        if table is not None:
+            _tables.move_to_end(key)
+
+    if table is None:
+        table = build_risk_table(input_row, predict_proba_rows)
+        with _tables_lock:
+            _tables[key] = table
+            while len(_tables) > max_profiles:
+                _tables.popitem(last=False)
+
+    return float(table[index])
+
+
+def clear_tables():
+    with _tables_lock:
+        _tables.clear()
+
+
+def check_table_accuracy(input_row, predict_proba_rows, samples=None, seed=0):
+    """
+    Compare the grid for input_row against direct one-row-at-a-time inference.
+    Checks every cell by default, or a random subset of `samples` cells.
+    Returns (max_abs_error, n_label_mismatches, n_checked).
+    """
+    table = build_risk_table(input_row, predict_proba_rows)
+    rows = grid_rows(input_row)
+    indices = np.arange(len(rows))
+    if samples is not None and samples < len(rows):
+        indices = np.random.default_rng(seed).choice(len(rows), samples, replace=False)
+
+    flat = table.ravel()
+    max_error = 0.0
+    mismatches = 0
+    for i in indices:
+        direct = float(np.asarray(predict_proba_rows([rows[i]]))[0])
+        max_error = max(max_error, abs(direct - float(flat[i])))
+        if (direct > DECISION_THRESHOLD) != (flat[i] > DECISION_THRESHOLD):
+            mismatches += 1
+    return max_error, mismatches, len(indices)
+
+
+if __name__ == "__main__":
+    # Accuracy check: python risk_table_module.py
+    # Builds grids for a few real profiles and compares every cell with direct inference.
+    # Expected: max error at float32 precision (~1e-7) and 0 label mismatches.
+    import joblib
+    import pandas as pd
+    from dataset_module import load_dataset
+
+    model = joblib.load('stroke_xgb_model.pkl')
+    preprocessor = joblib.load('preprocessor.pkl')
+
+    def predict_proba_rows(rows):
+        input_df = pd.DataFrame(rows, columns=INPUT_FEATURES)
+        return model.predict_proba(preprocessor.transform(input_df))[:, 1]
+
+    df = load_dataset('healthcare-dataset-stroke-data(3).csv')
+    df['bmi'] = df['bmi'].fillna(df['bmi'].mean())
+    for record in df.head(5).to_dict('records'):
+        input_row = {f: record[f] for f in INPUT_FEATURES}
+        max_error, mismatches, checked = check_table_accuracy(input_row, predict_proba_rows)
+        print(f"id={record['id']}: checked {checked} cells, max abs error {max_error:.2e}, label mismatches {mismatches}")
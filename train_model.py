@@ -7,12 +7,15 @@ from sklearn.compose import ColumnTransformer
 from sklearn.pipeline import Pipeline
 from imblearn.over_sampling import SMOTE
 import joblib
+from dataset_module import load_dataset
 
-# Load the dataset
+TRAINING_SOURCE = 'healthcare-dataset-stroke-data(3).csv'
+
+# Load the dataset from the columnar cache (rebuilt automatically if the CSV changed)
 try:
-    df = pd.read_csv('healthcare-dataset-stroke-data(3).csv')
-except FileNotFoundError:
-    print("Error: healthcare-dataset-stroke-data(3).csv not found. Please ensure the file is in the correct directory.")
+    df = load_dataset(TRAINING_SOURCE)
+except (FileNotFoundError, ValueError) as e:
+    print(f"Error: could not load {TRAINING_SOURCE}: {e}. Please ensure the file is in the correct directory.")
     exit()
 
 # Preprocessing
@@ -20,10 +23,12 @@ except FileNotFoundError:
 df = df.drop('id', axis=1)
 
 # Handle missing values for 'bmi' with the mean
-df['bmi'].fillna(df['bmi'].mean(), inplace=True)
+# (assigned, not inplace: cached columns are read-only memory maps)
+df['bmi'] = df['bmi'].fillna(df['bmi'].mean())
 
 # Convert 'gender' to numerical, handling 'Other' if present
-df['gender'] = df['gender'].replace('Other', df['gender'].mode()[0])
+# (cached category columns are Categoricals; replace on plain strings)
+df['gender'] = df['gender'].astype(str).replace('Other', df['gender'].mode()[0])
 
 # Add 'Heart Rate' and 'SpO2' columns, initializing with 0 for training
 # These will be updated with live MQTT data during prediction